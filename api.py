@@ -0,0 +1,173 @@
+# =========================================
+# API HTTP/JSON (SEM STREAMLIT)
+# =========================================
+# Endpoints para integrações (ex.: PDV enviando vendas em lote):
+#   GET  /products     → lista de produtos
+#   GET  /summary      → estoque, vendas e vencidos
+#   POST /products     → {"ean", "batch", "expiry", "quantity"}
+#   POST /adjustments  → [{"product_id", "movement_type", "quantity"}, ...]
+#
+# /adjustments aceita o cabeçalho "Idempotency-Key": reenviar o mesmo lote
+# com a mesma chave (ex.: após um timeout) não baixa o estoque duas vezes.
+#
+# Se API_TOKEN estiver definido, exige "Authorization: Bearer <token>".
+# Sem token, a API só aceita subir em 127.0.0.1 (padrão).
+#
+# Uso:
+#   python api.py --port 8080
+import argparse
+import hmac
+import json
+import os
+import traceback
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import psycopg
+
+from dados import (
+    EstoqueInsuficiente,
+    ProdutoNaoEncontrado,
+    calc_summary,
+    get_movements,
+    get_products,
+    insert_product,
+    registrar_movimentos,
+)
+
+API_TOKEN = os.environ.get("API_TOKEN")
+HOSTS_LOCAIS = ["127.0.0.1", "localhost", "::1"]
+
+
+def _df_para_json(df):
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _autorizado(self):
+        if not API_TOKEN:
+            return True
+        # comparação em tempo constante (não vaza o token por tempo de resposta)
+        recebido = self.headers.get("Authorization", "").encode("utf-8")
+        if hmac.compare_digest(recebido, f"Bearer {API_TOKEN}".encode("utf-8")):
+            return True
+        self._responder(401, {"erro": "não autorizado"})
+        return False
+
+    def _ler_json(self):
+        tamanho = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(tamanho) or b"null")
+
+    def _executar(self, rota):
+        # toda resposta de erro sai como JSON; nenhuma exceção fecha o socket
+        try:
+            rota()
+        except ProdutoNaoEncontrado as e:
+            self._responder(404, {"erro": str(e)})
+        except EstoqueInsuficiente as e:
+            self._responder(409, {"erro": f"estoque insuficiente: {e}"})
+        except (KeyError, TypeError, ValueError) as e:
+            self._responder(400, {"erro": f"requisição inválida: {e}"})
+        except psycopg.OperationalError:
+            self._responder(503, {"erro": "banco de dados indisponível"})
+        except psycopg.Error as e:
+            # violação de constraint, chave estrangeira etc.
+            self._responder(409, {"erro": f"conflito no banco: {e.__class__.__name__}"})
+        except Exception as e:
+            # qualquer outra falha (ex.: configuração do banco ausente)
+            self.log_error("erro interno em %s %s", self.command, self.path)
+            traceback.print_exc()
+            self._responder(500, {"erro": f"erro interno: {e.__class__.__name__}"})
+
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        self._executar(self._rotear_get)
+
+    def do_POST(self):
+        if not self._autorizado():
+            return
+        self._executar(self._rotear_post)
+
+    def _rota(self):
+        # ignora query string e fragmento: "/products?x=1" → "/products"
+        return urlsplit(self.path).path
+
+    def _rotear_get(self):
+        rota = self._rota()
+        if rota == "/products":
+            self._responder(200, _df_para_json(get_products()))
+        elif rota == "/summary":
+            total_stock, total_sales, total_expired = calc_summary(
+                get_products(), get_movements()
+            )
+            self._responder(
+                200,
+                {
+                    "total_stock": total_stock,
+                    "total_sales": total_sales,
+                    "total_expired": total_expired,
+                },
+            )
+        else:
+            self._responder(404, {"erro": "rota não encontrada"})
+
+    def _rotear_post(self):
+        try:
+            corpo = self._ler_json()
+        except ValueError:
+            self._responder(400, {"erro": "JSON inválido"})
+            return
+
+        rota = self._rota()
+        if rota == "/products":
+            product_id = insert_product(
+                str(corpo["ean"]),
+                str(corpo["batch"]),
+                date.fromisoformat(corpo["expiry"]),
+                int(corpo["quantity"]),
+            )
+            self._responder(201, {"id": product_id})
+        elif rota == "/adjustments":
+            if not isinstance(corpo, list):
+                raise ValueError("esperada uma lista de ajustes")
+
+            chave = self.headers.get("Idempotency-Key")
+            if chave is not None:
+                # prefixo separa as chaves da API das geradas pela fila local
+                chave = f"api:{chave}"
+
+            total, repetido = registrar_movimentos(corpo, chave=chave)
+            self._responder(200, {"registrados": total, "repetido": repetido})
+        else:
+            self._responder(404, {"erro": "rota não encontrada"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON do controle de validade.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    if not API_TOKEN and args.host not in HOSTS_LOCAIS:
+        parser.error(
+            f"defina API_TOKEN para expor a API em {args.host} "
+            "(sem token ela só sobe em 127.0.0.1)"
+        )
+
+    servidor = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"API ouvindo em http://{args.host}:{args.port}")
+    servidor.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
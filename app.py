@@ -1,22 +1,36 @@
 import streamlit as st
-import psycopg
-import pandas as pd
-from datetime import datetime, date
-from PIL import Image
-from fpdf import FPDF
-import io
-import plotly.express as px
+import ctypes.util
+import importlib.util
+import sys
+from datetime import date
 import streamlit.components.v1 as components
 
-# =========================================
-# TENTAR IMPORTAR PYZBAR (LEITOR DE BARRAS)
-# =========================================
-try:
-    from pyzbar.pyzbar import decode
-    BARCODE_ENABLED = True
-except Exception:
-    # No Streamlit Cloud, geralmente cai aqui
-    BARCODE_ENABLED = False
+# pandas, plotly, PIL e pyzbar são importados só nas páginas que os usam:
+# a tela de login (primeira coisa que aparece) não precisa de nenhum deles.
+
+import dados
+from dados import (
+    DIAS_A_VENCER,
+    calc_summary,
+    carregar_snapshot,
+    gerar_excel_relatorio,
+    gerar_pdf_relatorio,
+    get_movements,
+    get_products,
+    montar_relatorio,
+    separar_vencimentos,
+    validate_login,
+)
+from fila import (
+    ajustes_pendentes,
+    descartar,
+    enfileirar_movimento,
+    enfileirar_produto,
+    iniciar_worker,
+    listar_com_erro,
+    reenviar,
+    resumo_fila,
+)
 
 # =========================================
 # CONFIGURAÇÃO GLOBAL DA PÁGINA
@@ -74,39 +88,8 @@ def aplicar_estilo_profissional():
 
 
 # =========================================
-# CONEXÃO COM SUPABASE POSTGRES
-# =========================================
-def get_conn():
-    cfg = st.secrets["postgres"]
-    return psycopg.connect(
-        host=cfg["host"],
-        port=cfg["port"],
-        dbname=cfg["database"],
-        user=cfg["user"],
-        password=cfg["password"],
-        sslmode=cfg["sslmode"],
-    )
-
-# =========================================
-# LOGIN (USUÁRIO NO BANCO)
+# LOGIN
 # =========================================
-def validate_login(username, password):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, username
-        FROM validate_user(%s, %s)
-        """,
-        (username, password),
-    )
-
-    result = cur.fetchone()
-    cur.close()
-    conn.close()
-    return result
-
-
 def pagina_login():
     st.title("🔐 Login")
 
@@ -137,125 +120,39 @@ def exigir_login():
         st.stop()
 
 # =========================================
-# CRUD DE PRODUTOS E MOVIMENTOS
+# LEITURA DE CÓDIGO DE BARRAS (OPCIONAL)
 # =========================================
-def insert_product(ean, batch, expiry, quantity):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        INSERT INTO products (ean, batch, expiry, quantity)
-        VALUES (%s, %s, %s, %s)
-        RETURNING id;
-        """,
-        (ean, batch, expiry, quantity),
-    )
-
-    product_id = cur.fetchone()[0]
-
-    # movimento de entrada
-    cur.execute(
-        """
-        INSERT INTO movements (product_id, movement_type, quantity)
-        VALUES (%s, 'in', %s)
-        """,
-        (product_id, quantity),
-    )
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    return product_id
-
-
-def get_products():
-    conn = get_conn()
-    df = pd.read_sql("SELECT * FROM products ORDER BY expiry ASC", conn)
-    conn.close()
-    return df
-
-
-def update_product_quantity(product_id, new_qty, movement_type=None, diff_qty=0):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        UPDATE products
-        SET quantity = %s
-        WHERE id = %s
-        """,
-        (new_qty, product_id),
-    )
-
-    if movement_type and diff_qty > 0:
-        cur.execute(
-            """
-            INSERT INTO movements (product_id, movement_type, quantity)
-            VALUES (%s, %s, %s)
-            """,
-            (product_id, movement_type, diff_qty),
-        )
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-
-def get_movements():
-    conn = get_conn()
-    df = pd.read_sql("SELECT * FROM movements", conn)
-    conn.close()
-    return df
-
-
-def calc_summary():
-    products = get_products()
-    movements = get_movements()
-
-    # Estoque atual = soma das quantidades na tabela de produtos
-    total_stock = 0
-    if not products.empty:
-        total_stock = int(products["quantity"].sum())
-
-    # Vendas
-    total_sales = 0
-    if not movements.empty:
-        total_sales = int(
-            movements.loc[movements["movement_type"] == "sale", "quantity"].sum()
-        )
-
-    # -------- VENCIDOS --------
-    expired_by_movements = 0  # já baixados como vencidos
-    expired_in_stock = 0  # ainda no estoque, mas com data vencida
-
-    if not movements.empty:
-        expired_by_movements = int(
-            movements.loc[movements["movement_type"] == "expired", "quantity"].sum()
-        )
-
-    if not products.empty:
-        products = products.copy()
-        products["expiry_date"] = pd.to_datetime(products["expiry"]).dt.date
-        hoje = date.today()
-        expired_in_stock = int(
-            products.loc[products["expiry_date"] < hoje, "quantity"].sum()
-        )
-
-    # total vencido = em estoque + já descartado
-    total_expired = expired_by_movements + expired_in_stock
+@st.cache_resource(show_spinner=False)
+def barcode_disponivel():
+    # checagem barata: não importa o pyzbar nem carrega a libzbar.
+    # No Streamlit Cloud o pyzbar está instalado (requirements.txt), mas a
+    # libzbar do sistema não; por isso procura a biblioteca também.
+    if importlib.util.find_spec("pyzbar") is None:
+        return False
+    if sys.platform == "win32":
+        # no Windows a DLL vem dentro do próprio pacote pyzbar
+        return True
+    return ctypes.util.find_library("zbar") is not None
+
+
+@st.cache_resource(show_spinner=False)
+def carregar_decoder():
+    # só é chamado quando a câmera abre; fica em cache no processo
+    try:
+        from pyzbar.pyzbar import decode
+        return decode
+    except Exception:
+        # No Streamlit Cloud, geralmente cai aqui (libzbar ausente)
+        return None
 
-    return total_stock, total_sales, total_expired
 
-# =========================================
-# LEITURA DE CÓDIGO DE BARRAS (OPCIONAL)
-# =========================================
 def read_barcode_from_image(image_file):
-    # No Streamlit Cloud, BARCODE_ENABLED será False → sempre retorna None
-    if not BARCODE_ENABLED:
+    decode = carregar_decoder()
+    if decode is None:
         return None
 
+    from PIL import Image
+
     img = Image.open(image_file)
     decoded = decode(img)
     if decoded:
@@ -263,61 +160,6 @@ def read_barcode_from_image(image_file):
     return None
 
 
-# =========================================
-# GERAR PDF
-# =========================================
-def gerar_pdf_relatorio(df_produtos, total_stock, total_sales, total_expired):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 10, "Relatório de Validade de Produtos", ln=True, align="C")
-
-    pdf.set_font("Arial", "", 12)
-    pdf.cell(0, 8, f"Gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}", ln=True)
-    pdf.ln(5)
-
-    # Resumo
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "Resumo Geral:", ln=True)
-    pdf.set_font("Arial", "", 11)
-    pdf.cell(0, 6, f"Estoque total: {total_stock}", ln=True)
-    pdf.cell(0, 6, f"Quantidade vendida: {total_sales}", ln=True)
-    pdf.cell(0, 6, f"Quantidade vencida: {total_expired}", ln=True)
-
-    pdf.ln(8)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "Itens detalhados:", ln=True)
-
-    # Cabeçalho da tabela
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(30, 6, "EAN", border=1)
-    pdf.cell(25, 6, "Lote", border=1)
-    pdf.cell(25, 6, "Validade", border=1)
-    pdf.cell(20, 6, "Estoque", border=1)
-    pdf.cell(25, 6, "Vendida", border=1)
-    pdf.cell(25, 6, "Vencida", border=1)
-    pdf.ln(6)
-
-    # Linhas da tabela
-    pdf.set_font("Arial", "", 9)
-    for _, row in df_produtos.iterrows():
-        expiry = pd.to_datetime(row["expiry"]).strftime("%d/%m/%Y")
-
-        estoque_atual = int(row.get("quantity", 0))
-        qtd_vendida = int(row.get("sale", 0))
-        qtd_vencida = int(row.get("expired", 0))
-
-        pdf.cell(30, 6, str(row["ean"]), border=1)
-        pdf.cell(25, 6, str(row["batch"]), border=1)
-        pdf.cell(25, 6, expiry, border=1)
-        pdf.cell(20, 6, str(estoque_atual), border=1)
-        pdf.cell(25, 6, str(qtd_vendida), border=1)
-        pdf.cell(25, 6, str(qtd_vencida), border=1)
-        pdf.ln(6)
-
-    return bytes(pdf.output(dest="S"))
-
-
 # =========================================
 # PÁGINA: CADASTRO
 # =========================================
@@ -337,7 +179,14 @@ def pagina_cadastro():
     # =======================
     # Botão para abrir / fechar câmera
     # =======================
-    if BARCODE_ENABLED:
+    leitor_ok = barcode_disponivel()
+    if leitor_ok and st.session_state["show_camera"]:
+        leitor_ok = carregar_decoder() is not None
+        if not leitor_ok:
+            # import falhou mesmo assim: fecha a câmera para não travar o estado
+            st.session_state["show_camera"] = False
+
+    if leitor_ok:
         if st.session_state["show_camera"]:
             st.info("Aponte a câmera para o código de barras e tire a foto.")
 
@@ -380,8 +229,9 @@ def pagina_cadastro():
         ok = st.form_submit_button("Salvar")
 
     if ok:
-        insert_product(ean, lote, validade, int(quantidade))
-        st.success("Produto salvo com sucesso!")
+        # grava na fila local; o envio ao banco acontece em segundo plano
+        enfileirar_produto(ean, lote, validade, int(quantidade))
+        st.success("Produto salvo com sucesso! (sincronizando com o servidor)")
         # limpa EAN para próximo cadastro
         st.session_state["ean_scanned"] = ""
 
@@ -394,32 +244,35 @@ def pagina_estoque():
 
     st.title("📊 Controle de Estoque")
 
-    # ⚠️ Verificar produtos vencidos
-    df_check = get_products()
-
-    if not df_check.empty:
-        df_check["expiry_date"] = pd.to_datetime(df_check["expiry"]).dt.date
-        hoje = date.today()
-
-        vencidos = df_check[
-            (df_check["expiry_date"] < hoje) & (df_check["quantity"] > 0)
-        ]
-
-        if not vencidos.empty:
-            st.error(
-                f"⚠️ Atenção: Existem **{len(vencidos)}** produtos vencidos ainda no estoque!"
-            )
-
     df = get_products()
     if df.empty:
         st.info("Nenhum produto cadastrado.")
         return
 
+    # soma os movimentos que ainda estão na fila local ao valor do banco
+    pendentes = ajustes_pendentes()
+    if pendentes:
+        df["quantity"] = [
+            qtd + pendentes.get(pid, 0) for pid, qtd in zip(df["id"], df["quantity"])
+        ]
+
+    # ⚠️ Verificar produtos vencidos (reaproveita o mesmo DataFrame)
+    vencidos, a_vencer = separar_vencimentos(df)
+
+    if not vencidos.empty:
+        st.error(
+            f"⚠️ Atenção: Existem **{len(vencidos)}** produtos vencidos ainda no estoque!"
+        )
+    if not a_vencer.empty:
+        st.warning(
+            f"⏳ **{len(a_vencer)}** produtos vencem nos próximos {DIAS_A_VENCER} dias."
+        )
+
     # montar descrição bonita
-    df["ean"] = df["ean"].astype(str)
-    df["batch"] = df["batch"].astype(str)
-    df["expiry_str"] = pd.to_datetime(df["expiry"]).dt.strftime("%d/%m/%Y")
-    df["desc"] = df["ean"] + " | Lote " + df["batch"] + " | Val " + df["expiry_str"]
+    df["desc"] = [
+        f"{ean} | Lote {batch} | Val {expiry:%d/%m/%Y}"
+        for ean, batch, expiry in zip(df["ean"], df["batch"], df["expiry"])
+    ]
 
     escolha = st.selectbox("Escolha o item", df["desc"])
 
@@ -442,7 +295,7 @@ def pagina_estoque():
         elif nova > estoque_atual:
             # aumento de estoque (entrada simples)
             diff = nova - estoque_atual
-            update_product_quantity(prod_id, nova, "in", diff)
+            enfileirar_movimento(prod_id, "in", diff)
             st.success(f"Entrada registrada (+{diff}).")
             st.session_state["show_modal"] = False
             st.session_state["pending_update"] = None
@@ -484,9 +337,8 @@ def pagina_estoque():
                 elif motivo == "Outro ajuste":
                     movement_type = "adjust"
 
-                update_product_quantity(
+                enfileirar_movimento(
                     pending["product_id"],
-                    pending["new"],
                     movement_type,
                     pending["diff"],
                 )
@@ -509,62 +361,57 @@ def pagina_estoque():
 # =========================================
 # PÁGINA: RELATÓRIOS
 # =========================================
-def pagina_relatorios():
-    exigir_login()
-    st.title("📈 Relatórios")
+IDADE_MAX_SNAPSHOT = 1  # dias; snapshot mais velho não é usado por padrão
 
-    # Produtos e movimentos
-    df_prod = get_products()
-    total_stock, total_sales, total_expired = calc_summary()
 
-    if df_prod.empty:
-        st.info("Nenhum produto cadastrado ainda.")
-        return
+def pagina_relatorios():
+    exigir_login()
 
-    df_mov = get_movements()
+    st.title("📈 Relatórios")
 
-    # ===============================
-    # Montar DF consolidado por produto
-    # ===============================
-    if not df_mov.empty:
-        mov_agg = (
-            df_mov.groupby(["product_id", "movement_type"])["quantity"]
-            .sum()
-            .unstack(fill_value=0)
-            .reset_index()
-        )
-    else:
-        mov_agg = pd.DataFrame(
-            columns=["product_id", "sale", "expired", "in", "adjust"]
+    # Snapshot diário (digest.py) → abre instantâneo, sem varrer as tabelas
+    # só abre no snapshot por padrão se ele for recente (job rodando em dia)
+    snapshot = carregar_snapshot()
+    ao_vivo = True
+    if snapshot is not None:
+        resumo = snapshot["resumo"]
+        idade = (date.today() - date.fromisoformat(resumo["dia"])).days
+        recente = idade <= IDADE_MAX_SNAPSHOT
+        if not recente:
+            st.warning(
+                f"⚠️ O último snapshot tem {idade} dias (gerado em {resumo['gerado_em']}). "
+                "Mostrando dados ao vivo — verifique o job diário (digest.py)."
+            )
+        ao_vivo = st.checkbox(
+            "Recalcular com dados ao vivo",
+            value=not recente,
+            help=f"Snapshot gerado em {resumo['gerado_em']}.",
         )
 
-    df_rel = df_prod.merge(
-        mov_agg, left_on="id", right_on="product_id", how="left"
-    )
+    if ao_vivo:
+        # Produtos e movimentos
+        df_prod = get_products()
+        if df_prod.empty:
+            st.info("Nenhum produto cadastrado ainda.")
+            return
 
-    # Garantir colunas de movimento
-    for col in ["sale", "expired", "in", "adjust"]:
-        if col not in df_rel.columns:
-            df_rel[col] = 0
+        df_mov = get_movements()
+        total_stock, total_sales, total_expired = calc_summary(df_prod, df_mov)
 
-    df_rel[["sale", "expired", "in", "adjust"]] = (
-        df_rel[["sale", "expired", "in", "adjust"]].fillna(0).astype(int)
-    )
-    # -----------------------------
-    # CALCULAR VENCIDOS AUTOMÁTICOS
-    # -----------------------------
-    df_rel["expiry_date"] = pd.to_datetime(df_rel["expiry"]).dt.date
-    hoje = date.today()
-
-    df_rel["expired_auto"] = df_rel.apply(
-        lambda row: row["quantity"] if row["expiry_date"] < hoje else 0,
-        axis=1,
-    )
+        # ===============================
+        # Montar DF consolidado por produto
+        # ===============================
+        df_rel = montar_relatorio(df_prod, df_mov)
+    else:
+        st.caption(f"📅 Dados do snapshot de {resumo['gerado_em']}.")
+        total_stock = resumo["total_stock"]
+        total_sales = resumo["total_sales"]
+        total_expired = resumo["total_expired"]
+        df_rel = snapshot["df_rel"]
 
-    # -----------------------------
-    # VENCIDO TOTAL = movimento + automático
-    # -----------------------------
-    df_rel["expired_total"] = df_rel["expired"] + df_rel["expired_auto"]
+        if df_rel.empty:
+            st.info("Nenhum produto cadastrado ainda.")
+            return
 
     # ===============================
     # Métricas gerais
@@ -577,6 +424,10 @@ def pagina_relatorios():
     # ===============================
     # Gráfico de pizza (donut)
     # ===============================
+    # importados só aqui: título e métricas já aparecem enquanto carregam
+    import pandas as pd
+    import plotly.express as px
+
     df_graf = pd.DataFrame(
         {
             "Categoria": ["Estoque", "Vendas", "Vencidos"],
@@ -641,9 +492,7 @@ def pagina_relatorios():
         "Vencida (total)",
     ]
 
-    df_tela_view["Validade"] = pd.to_datetime(
-        df_tela_view["Validade"]
-    ).dt.strftime("%d/%m/%Y")
+    df_tela_view["Validade"] = df_tela_view["Validade"].dt.strftime("%d/%m/%Y")
 
     st.dataframe(df_tela_view, use_container_width=True)
 
@@ -652,58 +501,74 @@ def pagina_relatorios():
     # ===============================
     st.subheader("Exportar:")
 
-    # Excel em português
-    excel_buffer = io.BytesIO()
-    df_export = df_rel.copy()
-
-    # remover timezone de qualquer coluna datetime com tz
-    for col in df_export.select_dtypes(include=["datetimetz"]).columns:
-        df_export[col] = df_export[col].dt.tz_localize(None)
+    # Excel em português / PDF (pré-gerados pelo snapshot, se houver)
+    if ao_vivo:
+        excel_bytes = gerar_excel_relatorio(df_rel)
+        pdf_bytes = gerar_pdf_relatorio(
+            df_rel, total_stock, total_sales, total_expired
+        )
+    else:
+        excel_bytes = snapshot["excel"]
+        pdf_bytes = snapshot["pdf"]
 
-    df_export["Validade"] = pd.to_datetime(df_export["expiry"]).dt.strftime(
-        "%d/%m/%Y"
+    st.download_button(
+        "📥 Baixar Excel (pt-BR)",
+        excel_bytes,
+        "relatorio_validade.xlsx",
     )
+    st.download_button("📄 Baixar PDF", pdf_bytes, "relatorio_validade.pdf")
 
-    df_excel = df_rel[
-        [
-            "ean",
-            "batch",
-            "expiry",
-            "quantity",
-            "sale",
-            "expired",
-            "expired_auto",
-            "expired_total",
-        ]
-    ].rename(
-        columns={
-            "ean": "EAN",
-            "batch": "Lote",
-            "expiry": "Validade",
-            "quantity": "Qtde em estoque",
-            "sale": "Qtde vendida",
-            "expired": "Qtde vencida (registrada)",
-            "expired_auto": "Qtde vencida em estoque",
-            "expired_total": "Qtde vencida (total)",
-        }
-    )
 
-    df_excel["Validade"] = pd.to_datetime(
-        df_excel["Validade"]
-    ).dt.strftime("%d/%m/%Y")
+# =========================================
+# STATUS DA FILA DE SINCRONIZAÇÃO
+# =========================================
+def mostrar_status_sincronizacao():
+    status = resumo_fila()
+
+    if status["com_erro"]:
+        st.caption(f"❗ {status['com_erro']} gravações com erro (não enviadas)")
+    if status["pendentes"]:
+        texto = f"🔄 {status['pendentes']} gravações pendentes"
+        if status["ultimo_erro"]:
+            texto += f" — falha no envio, tentando novamente ({status['ultimo_erro']})"
+        st.caption(texto)
+    elif not status["com_erro"]:
+        st.caption("✅ Tudo sincronizado")
+
+    return status
+
+
+def descrever_operacao(op):
+    payload = op["payload"]
+    if op["tipo"] == "insert_product":
+        return (
+            f"Cadastro: EAN {payload['ean']} | Lote {payload['batch']} | "
+            f"Val {date.fromisoformat(payload['expiry']):%d/%m/%Y} | Qtde {payload['quantity']}"
+        )
+    tipo = payload["movement_type"]
+    return f"Movimento '{tipo}' de {payload['quantity']} un. no produto #{payload['product_id']}"
 
-    df_excel.to_excel(excel_buffer, index=False, sheet_name="Relatório")
-    excel_buffer.seek(0)
 
-    st.download_button(
-        "📥 Baixar Excel (pt-BR)",
-        excel_buffer.getvalue(),
-        "relatorio_validade.xlsx",
-    )
+def mostrar_operacoes_com_erro():
+    # gravações que o servidor recusou: o usuário decide reenviar ou descartar
+    ops = listar_com_erro()
+    if not ops:
+        return
 
-    # PDF
-    pdf_bytes = gerar_pdf_relatorio(df_rel, total_stock, total_sales, total_expired)
-    st.download_button("📄 Baixar PDF", pdf_bytes, "relatorio_validade.pdf")
+    with st.expander(f"❗ {len(ops)} gravações não enviadas", expanded=True):
+        for op in ops:
+            st.write(f"**{descrever_operacao(op)}**")
+            st.caption(f"Criada em {op['criado_em'][:16]} — erro: {op['ultimo_erro']}")
+
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("🔁 Tentar de novo", key=f"reenviar_{op['id']}"):
+                    reenviar(op["id"])
+                    st.rerun()
+            with col2:
+                if st.button("🗑️ Descartar", key=f"descartar_{op['id']}"):
+                    descartar(op["id"])
+                    st.rerun()
 
 
 # =========================================
@@ -712,6 +577,10 @@ def pagina_relatorios():
 def main():
     aplicar_estilo_profissional()
 
+    # camada de dados usa as credenciais do Streamlit (st.secrets)
+    dados.configurar(st.secrets["postgres"])
+    iniciar_worker()
+
     # Estados iniciais
     if "logged" not in st.session_state:
         st.session_state["logged"] = False
@@ -742,6 +611,10 @@ def main():
                 f"<p style='text-align: right; margin-top: 0.6rem;'>👤 <b>{st.session_state['username']}</b></p>",
                 unsafe_allow_html=True,
             )
+            status_fila = mostrar_status_sincronizacao()
+
+    if status_fila["com_erro"]:
+        mostrar_operacoes_com_erro()
 
     # =========================
     # MENU SUPERIOR (RADIO HORIZONTAL)
@@ -0,0 +1,608 @@
+# =========================================
+# CAMADA DE DADOS (SEM STREAMLIT)
+# =========================================
+# Banco, resumo e exportações usados pelo app, pelo digest.py e pela api.py.
+# Importar este módulo não carrega o Streamlit; pandas e fpdf só são
+# importados dentro das funções que os usam (o login não precisa deles).
+import io
+import json
+import os
+from datetime import datetime, date, timedelta
+
+import psycopg
+
+# =========================================
+# CONFIGURAÇÃO (AMBIENTE / ARQUIVO)
+# =========================================
+# Ordem de precedência:
+#   1. configurar(...) chamado explicitamente (ex.: app Streamlit com st.secrets)
+#   2. variáveis de ambiente POSTGRES_HOST, POSTGRES_PORT, ...
+#   3. seção [postgres] do arquivo TOML em CONFIG_FILE
+#      (padrão: .streamlit/secrets.toml, o mesmo usado pelo Streamlit)
+CONFIG_FILE = os.environ.get("CONFIG_FILE", os.path.join(".streamlit", "secrets.toml"))
+CHAVES_POSTGRES = ["host", "port", "database", "user", "password", "sslmode"]
+
+_config = None
+
+
+def configurar(cfg):
+    global _config
+    _config = {chave: cfg[chave] for chave in CHAVES_POSTGRES}
+
+
+def _config_do_ambiente():
+    cfg = {
+        chave: os.environ.get(f"POSTGRES_{chave.upper()}") for chave in CHAVES_POSTGRES
+    }
+    if cfg["host"] is None:
+        return None
+    if cfg["port"] is None:
+        cfg["port"] = 5432
+    if cfg["sslmode"] is None:
+        cfg["sslmode"] = "require"
+    return cfg
+
+
+def _config_do_arquivo():
+    if not os.path.exists(CONFIG_FILE):
+        return None
+    try:
+        import tomllib
+
+        with open(CONFIG_FILE, "rb") as f:
+            conteudo = tomllib.load(f)
+    except ImportError:
+        # Python < 3.11: o Streamlit já instala o pacote "toml"
+        import toml
+
+        conteudo = toml.load(CONFIG_FILE)
+    return conteudo.get("postgres")
+
+
+def get_config():
+    if _config is None:
+        cfg = _config_do_ambiente() or _config_do_arquivo()
+        if cfg is None:
+            raise RuntimeError(
+                "Configuração do Postgres não encontrada: defina POSTGRES_HOST etc. "
+                f"ou a seção [postgres] em {CONFIG_FILE}."
+            )
+        configurar(cfg)
+    return _config
+
+
+# =========================================
+# CONEXÃO COM SUPABASE POSTGRES
+# =========================================
+def get_conn():
+    cfg = get_config()
+    return psycopg.connect(
+        host=cfg["host"],
+        port=cfg["port"],
+        dbname=cfg["database"],
+        user=cfg["user"],
+        password=cfg["password"],
+        sslmode=cfg["sslmode"],
+    )
+
+# =========================================
+# LOGIN (USUÁRIO NO BANCO)
+# =========================================
+def validate_login(username, password):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, username
+            FROM validate_user(%s, %s)
+            """,
+            (username, password),
+        )
+
+        result = cur.fetchone()
+        cur.close()
+    finally:
+        conn.close()
+    return result
+
+# =========================================
+# LEITURA TIPADA (DATAFRAMES COMPACTOS)
+# =========================================
+# Só as colunas usadas, já com dtypes enxutos: category para textos
+# repetidos, int32 para quantidades e datetime64 para a validade.
+# Assim as páginas não precisam reconverter com astype/to_datetime.
+COLUNAS_PRODUTOS = {
+    "id": "int64",
+    "ean": "category",
+    "batch": "category",
+    "expiry": "datetime64[ns]",
+    "quantity": "int32",
+}
+COLUNAS_MOVIMENTOS = {
+    "product_id": "int64",
+    "movement_type": "category",
+    "quantity": "int32",
+}
+LOTE_LEITURA = 5000
+
+
+def _carregar_tipado(tabela, colunas, order_by=None):
+    import pandas as pd
+
+    sql = f"SELECT {', '.join(colunas)} FROM {tabela}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+
+    valores = {nome: [] for nome in colunas}
+
+    # cursor nomeado (server-side): as linhas vêm do banco em lotes,
+    # sem materializar o resultado inteiro em tuplas de uma vez
+    conn = get_conn()
+    try:
+        cur = conn.cursor(name=f"leitura_{tabela}")
+        cur.execute(sql)
+        while True:
+            linhas = cur.fetchmany(LOTE_LEITURA)
+            if not linhas:
+                break
+            for nome, coluna in zip(colunas, zip(*linhas)):
+                valores[nome].extend(coluna)
+        cur.close()
+    finally:
+        conn.close()
+
+    return pd.DataFrame(
+        {nome: pd.Series(valores[nome], dtype=dtype) for nome, dtype in colunas.items()}
+    )
+
+
+# =========================================
+# CRUD DE PRODUTOS E MOVIMENTOS
+# =========================================
+# As funções *_cur recebem um cursor e não fazem commit: quem chama controla
+# a transação (usadas também pela fila local em fila.py).
+def insert_product_cur(cur, ean, batch, expiry, quantity):
+    cur.execute(
+        """
+        INSERT INTO products (ean, batch, expiry, quantity)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id;
+        """,
+        (ean, batch, expiry, quantity),
+    )
+
+    product_id = cur.fetchone()[0]
+
+    # movimento de entrada
+    cur.execute(
+        """
+        INSERT INTO movements (product_id, movement_type, quantity)
+        VALUES (%s, 'in', %s)
+        """,
+        (product_id, quantity),
+    )
+    return product_id
+
+
+def insert_product(ean, batch, expiry, quantity):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        product_id = insert_product_cur(cur, ean, batch, expiry, quantity)
+        conn.commit()
+        cur.close()
+    finally:
+        # sem commit, fechar a conexão desfaz a transação
+        conn.close()
+    return product_id
+
+
+def get_products():
+    return _carregar_tipado("products", COLUNAS_PRODUTOS, order_by="expiry ASC")
+
+
+MOVEMENT_TYPES = ["in", "sale", "expired", "adjust"]
+
+
+class MovimentoRecusado(ValueError):
+    pass
+
+
+class ProdutoNaoEncontrado(MovimentoRecusado):
+    pass
+
+
+class EstoqueInsuficiente(MovimentoRecusado):
+    pass
+
+
+def sinal_movimento(movement_type):
+    # entrada soma no estoque; venda, vencido e ajuste subtraem
+    return 1 if movement_type == "in" else -1
+
+
+def apply_movement_cur(cur, product_id, movement_type, quantity):
+    # variação relativa (quantity = quantity ± n): pode ser aplicada depois
+    # de outras escritas sem sobrescrevê-las
+    variacao = sinal_movimento(movement_type) * quantity
+    cur.execute(
+        """
+        UPDATE products
+        SET quantity = quantity + %s
+        WHERE id = %s AND quantity + %s >= 0
+        """,
+        (variacao, product_id, variacao),
+    )
+
+    if cur.rowcount == 0:
+        # nada atualizado: produto inexistente ou estoque ficaria negativo
+        cur.execute("SELECT quantity FROM products WHERE id = %s", (product_id,))
+        linha = cur.fetchone()
+        if linha is None:
+            raise ProdutoNaoEncontrado(f"produto {product_id} não encontrado")
+        raise EstoqueInsuficiente(
+            f"produto {product_id}: estoque {linha[0]}, baixa de {quantity}"
+        )
+
+    cur.execute(
+        """
+        INSERT INTO movements (product_id, movement_type, quantity)
+        VALUES (%s, %s, %s)
+        """,
+        (product_id, movement_type, quantity),
+    )
+
+
+def registrar_movimentos(itens, chave=None):
+    # itens: [{"product_id": .., "movement_type": .., "quantity": ..}, ...]
+    # tudo numa única transação: ou entra o lote inteiro, ou nada.
+    # Com `chave` (idempotência), um lote repetido não é reaplicado.
+    # Retorna (quantidade de itens, repetido).
+    linhas = []
+    for item in itens:
+        movement_type = item["movement_type"]
+        quantity = int(item["quantity"])
+        if movement_type not in MOVEMENT_TYPES:
+            raise ValueError(f"movement_type inválido: {movement_type!r}")
+        if quantity <= 0:
+            raise ValueError("quantity deve ser maior que zero")
+        linhas.append((int(item["product_id"]), movement_type, quantity))
+
+    if not linhas:
+        return 0, False
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+
+        if chave is not None:
+            cur.execute(
+                """
+                INSERT INTO write_log (idempotency_key)
+                VALUES (%s)
+                ON CONFLICT DO NOTHING
+                """,
+                (chave,),
+            )
+            if cur.rowcount == 0:
+                return len(linhas), True
+
+        for product_id, movement_type, quantity in linhas:
+            apply_movement_cur(cur, product_id, movement_type, quantity)
+
+        conn.commit()
+        cur.close()
+    finally:
+        # sem commit (erro ou lote repetido), fechar desfaz a transação
+        conn.close()
+    return len(linhas), False
+
+
+def get_movements():
+    return _carregar_tipado("movements", COLUNAS_MOVIMENTOS)
+
+
+def calc_summary(products=None, movements=None, hoje=None):
+    import pandas as pd
+
+    if hoje is None:
+        hoje = date.today()
+
+    # permite reaproveitar DataFrames já carregados (evita nova varredura)
+    if products is None:
+        products = get_products()
+    if movements is None:
+        movements = get_movements()
+
+    # Estoque atual = soma das quantidades na tabela de produtos
+    total_stock = 0
+    if not products.empty:
+        total_stock = int(products["quantity"].sum())
+
+    # Vendas
+    total_sales = 0
+    if not movements.empty:
+        total_sales = int(
+            movements.loc[movements["movement_type"] == "sale", "quantity"].sum()
+        )
+
+    # -------- VENCIDOS --------
+    expired_by_movements = 0  # já baixados como vencidos
+    expired_in_stock = 0  # ainda no estoque, mas com data vencida
+
+    if not movements.empty:
+        expired_by_movements = int(
+            movements.loc[movements["movement_type"] == "expired", "quantity"].sum()
+        )
+
+    if not products.empty:
+        expired_in_stock = int(
+            products.loc[products["expiry"] < pd.Timestamp(hoje), "quantity"].sum()
+        )
+
+    # total vencido = em estoque + já descartado
+    total_expired = expired_by_movements + expired_in_stock
+
+    return total_stock, total_sales, total_expired
+
+
+# =========================================
+# VENCIDOS / A VENCER
+# =========================================
+DIAS_A_VENCER = 7
+
+
+def separar_vencimentos(products, hoje=None, dias=DIAS_A_VENCER):
+    import pandas as pd
+
+    # retorna (vencidos, a_vencer) considerando só itens com estoque
+    if hoje is None:
+        hoje = date.today()
+
+    if products.empty:
+        return products, products
+
+    com_estoque = products["quantity"] > 0
+    limite = pd.Timestamp(hoje + timedelta(days=dias))
+    hoje = pd.Timestamp(hoje)
+
+    vencidos = products[com_estoque & (products["expiry"] < hoje)]
+    a_vencer = products[
+        com_estoque
+        & (products["expiry"] >= hoje)
+        & (products["expiry"] <= limite)
+    ]
+    return vencidos, a_vencer
+
+
+# =========================================
+# RELATÓRIO CONSOLIDADO POR PRODUTO
+# =========================================
+def montar_relatorio(df_prod, df_mov, hoje=None):
+    import pandas as pd
+
+    if hoje is None:
+        hoje = date.today()
+
+    if not df_mov.empty:
+        mov_agg = (
+            df_mov.groupby(["product_id", "movement_type"], observed=True)["quantity"]
+            .sum()
+            .unstack(fill_value=0)
+        )
+        # colunas vêm como CategoricalIndex; volta para texto antes do reset
+        mov_agg.columns = mov_agg.columns.astype(str)
+        mov_agg = mov_agg.reset_index()
+    else:
+        mov_agg = pd.DataFrame(
+            columns=["product_id", "sale", "expired", "in", "adjust"]
+        )
+
+    df_rel = df_prod.merge(
+        mov_agg, left_on="id", right_on="product_id", how="left"
+    )
+
+    # Garantir colunas de movimento
+    for col in ["sale", "expired", "in", "adjust"]:
+        if col not in df_rel.columns:
+            df_rel[col] = 0
+
+    df_rel[["sale", "expired", "in", "adjust"]] = (
+        df_rel[["sale", "expired", "in", "adjust"]].fillna(0).astype(int)
+    )
+    # -----------------------------
+    # CALCULAR VENCIDOS AUTOMÁTICOS
+    # -----------------------------
+    df_rel["expired_auto"] = df_rel["quantity"].where(
+        df_rel["expiry"] < pd.Timestamp(hoje), 0
+    )
+
+    # -----------------------------
+    # VENCIDO TOTAL = movimento + automático
+    # -----------------------------
+    df_rel["expired_total"] = df_rel["expired"] + df_rel["expired_auto"]
+
+    return df_rel
+
+# =========================================
+# GERAR PDF
+# =========================================
+def gerar_pdf_relatorio(df_produtos, total_stock, total_sales, total_expired):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 10, "Relatório de Validade de Produtos", ln=True, align="C")
+
+    pdf.set_font("Arial", "", 12)
+    pdf.cell(0, 8, f"Gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}", ln=True)
+    pdf.ln(5)
+
+    # Resumo
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, "Resumo Geral:", ln=True)
+    pdf.set_font("Arial", "", 11)
+    pdf.cell(0, 6, f"Estoque total: {total_stock}", ln=True)
+    pdf.cell(0, 6, f"Quantidade vendida: {total_sales}", ln=True)
+    pdf.cell(0, 6, f"Quantidade vencida: {total_expired}", ln=True)
+
+    pdf.ln(8)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, "Itens detalhados:", ln=True)
+
+    # Cabeçalho da tabela
+    pdf.set_font("Arial", "B", 9)
+    pdf.cell(30, 6, "EAN", border=1)
+    pdf.cell(25, 6, "Lote", border=1)
+    pdf.cell(25, 6, "Validade", border=1)
+    pdf.cell(20, 6, "Estoque", border=1)
+    pdf.cell(25, 6, "Vendida", border=1)
+    pdf.cell(25, 6, "Vencida", border=1)
+    pdf.ln(6)
+
+    # Linhas da tabela
+    pdf.set_font("Arial", "", 9)
+    for _, row in df_produtos.iterrows():
+        expiry = row["expiry"].strftime("%d/%m/%Y")
+
+        estoque_atual = int(row.get("quantity", 0))
+        qtd_vendida = int(row.get("sale", 0))
+        qtd_vencida = int(row.get("expired", 0))
+
+        pdf.cell(30, 6, str(row["ean"]), border=1)
+        pdf.cell(25, 6, str(row["batch"]), border=1)
+        pdf.cell(25, 6, expiry, border=1)
+        pdf.cell(20, 6, str(estoque_atual), border=1)
+        pdf.cell(25, 6, str(qtd_vendida), border=1)
+        pdf.cell(25, 6, str(qtd_vencida), border=1)
+        pdf.ln(6)
+
+    return bytes(pdf.output(dest="S"))
+
+
+# =========================================
+# GERAR EXCEL
+# =========================================
+def gerar_excel_relatorio(df_rel):
+    excel_buffer = io.BytesIO()
+
+    df_excel = df_rel[
+        [
+            "ean",
+            "batch",
+            "expiry",
+            "quantity",
+            "sale",
+            "expired",
+            "expired_auto",
+            "expired_total",
+        ]
+    ].rename(
+        columns={
+            "ean": "EAN",
+            "batch": "Lote",
+            "expiry": "Validade",
+            "quantity": "Qtde em estoque",
+            "sale": "Qtde vendida",
+            "expired": "Qtde vencida (registrada)",
+            "expired_auto": "Qtde vencida em estoque",
+            "expired_total": "Qtde vencida (total)",
+        }
+    )
+
+    df_excel["Validade"] = df_excel["Validade"].dt.strftime("%d/%m/%Y")
+
+    df_excel.to_excel(excel_buffer, index=False, sheet_name="Relatório")
+    return excel_buffer.getvalue()
+
+
+# =========================================
+# SNAPSHOT DIÁRIO (GERADO PELO digest.py)
+# =========================================
+DIGEST_DIR = os.environ.get("DIGEST_DIR", "digest")
+
+
+def caminho_snapshot(dia=None):
+    if dia is None:
+        dia = date.today()
+    return os.path.join(DIGEST_DIR, dia.isoformat())
+
+
+# colunas do relatório gravadas no snapshot (CSV) e seus dtypes na leitura
+COLUNAS_RELATORIO = {
+    "ean": "category",
+    "batch": "category",
+    "expiry": "datetime64[ns]",
+    "quantity": "int32",
+    "sale": "int64",
+    "expired": "int64",
+    "expired_auto": "int64",
+    "expired_total": "int64",
+}
+
+
+def salvar_relatorio_snapshot(df_rel, pasta):
+    df_rel[list(COLUNAS_RELATORIO)].to_csv(
+        os.path.join(pasta, "relatorio.csv"), index=False, date_format="%Y-%m-%d"
+    )
+
+
+def _ler_relatorio_snapshot(caminho):
+    import pandas as pd
+
+    # ean/lote lidos como texto (preserva zeros à esquerda) e tipados depois
+    df = pd.read_csv(caminho, dtype={"ean": str, "batch": str})
+    df["expiry"] = pd.to_datetime(df["expiry"])
+    return df.astype(COLUNAS_RELATORIO)
+
+
+def _ultimo_snapshot():
+    # pasta AAAA-MM-DD mais recente (até hoje) com o snapshot completo
+    if not os.path.isdir(DIGEST_DIR):
+        return None
+
+    hoje = date.today()
+    dias = []
+    for nome in os.listdir(DIGEST_DIR):
+        try:
+            dia = date.fromisoformat(nome)
+        except ValueError:
+            continue
+        pasta = os.path.join(DIGEST_DIR, nome)
+        if dia <= hoje and all(
+            os.path.exists(os.path.join(pasta, arquivo))
+            for arquivo in ["resumo.json", "relatorio.csv"]
+        ):
+            dias.append(dia)
+
+    return max(dias) if dias else None
+
+
+def carregar_snapshot(dia=None):
+    # sem dia → usa o snapshot mais recente; None se o job nunca rodou
+    if dia is None:
+        dia = _ultimo_snapshot()
+        if dia is None:
+            return None
+
+    pasta = caminho_snapshot(dia)
+    resumo_path = os.path.join(pasta, "resumo.json")
+    relatorio_path = os.path.join(pasta, "relatorio.csv")
+    if not (os.path.exists(resumo_path) and os.path.exists(relatorio_path)):
+        return None
+
+    with open(resumo_path, encoding="utf-8") as f:
+        resumo = json.load(f)
+
+    snapshot = {"resumo": resumo}
+    for chave, arquivo in [
+        ("pdf", "relatorio_validade.pdf"),
+        ("excel", "relatorio_validade.xlsx"),
+    ]:
+        with open(os.path.join(pasta, arquivo), "rb") as f:
+            snapshot[chave] = f.read()
+
+    snapshot["df_rel"] = _ler_relatorio_snapshot(relatorio_path)
+    return snapshot
@@ -0,0 +1,175 @@
+# =========================================
+# JOB DIÁRIO DE VENCIMENTOS (FORA DO STREAMLIT)
+# =========================================
+# Calcula uma vez por dia os itens vencidos e a vencer, grava o snapshot
+# em DIGEST_DIR/AAAA-MM-DD/ (lido pela página de Relatórios) e escreve o
+# resumo + anexos em DIGEST_DIR/outbox/ para distribuição.
+#
+# Cron (todo dia às 6h):
+#   0 6 * * * cd /caminho/do/app && python digest.py
+import argparse
+import json
+import os
+from datetime import date, datetime
+
+from dados import (
+    DIAS_A_VENCER,
+    DIGEST_DIR,
+    calc_summary,
+    caminho_snapshot,
+    gerar_excel_relatorio,
+    gerar_pdf_relatorio,
+    get_movements,
+    get_products,
+    montar_relatorio,
+    salvar_relatorio_snapshot,
+    separar_vencimentos,
+)
+
+
+def _itens(df):
+    return [
+        {
+            "ean": str(row["ean"]),
+            "batch": str(row["batch"]),
+            "expiry": row["expiry"].date().isoformat(),
+            "quantity": int(row["quantity"]),
+        }
+        for _, row in df.iterrows()
+    ]
+
+
+def gerar_digest(dia=None, dias=DIAS_A_VENCER):
+    if dia is None:
+        dia = date.today()
+
+    # uma única leitura de cada tabela para tudo (resumo, listas, relatórios)
+    df_prod = get_products()
+    df_mov = get_movements()
+
+    total_stock, total_sales, total_expired = calc_summary(df_prod, df_mov, hoje=dia)
+    vencidos, a_vencer = separar_vencimentos(df_prod, hoje=dia, dias=dias)
+    df_rel = montar_relatorio(df_prod, df_mov, hoje=dia)
+
+    resumo = {
+        "dia": dia.isoformat(),
+        "gerado_em": datetime.now().strftime("%d/%m/%Y %H:%M"),
+        "dias_a_vencer": dias,
+        "total_stock": total_stock,
+        "total_sales": total_sales,
+        "total_expired": total_expired,
+        "vencidos": _itens(vencidos),
+        "a_vencer": _itens(a_vencer),
+    }
+
+    pasta = caminho_snapshot(dia)
+    os.makedirs(pasta, exist_ok=True)
+
+    with open(os.path.join(pasta, "relatorio_validade.pdf"), "wb") as f:
+        f.write(gerar_pdf_relatorio(df_rel, total_stock, total_sales, total_expired))
+    with open(os.path.join(pasta, "relatorio_validade.xlsx"), "wb") as f:
+        f.write(gerar_excel_relatorio(df_rel))
+    salvar_relatorio_snapshot(df_rel, pasta)
+
+    # resumo.json por último: é ele que marca o snapshot como completo
+    tmp_path = os.path.join(pasta, "resumo.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(resumo, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(pasta, "resumo.json"))
+
+    return resumo
+
+
+def formatar_digest(resumo):
+    linhas = [
+        f"Controle de Validade — resumo de {resumo['dia']}",
+        f"Gerado em {resumo['gerado_em']}",
+        "",
+        f"Estoque total: {resumo['total_stock']}",
+        f"Quantidade vendida: {resumo['total_sales']}",
+        f"Quantidade vencida: {resumo['total_expired']}",
+        "",
+        f"VENCIDOS EM ESTOQUE ({len(resumo['vencidos'])}):",
+    ]
+    for item in resumo["vencidos"]:
+        linhas.append(
+            f"  - EAN {item['ean']} | Lote {item['batch']} | "
+            f"Val {item['expiry']} | Qtde {item['quantity']}"
+        )
+
+    linhas.append("")
+    linhas.append(
+        f"A VENCER EM {resumo['dias_a_vencer']} DIAS ({len(resumo['a_vencer'])}):"
+    )
+    for item in resumo["a_vencer"]:
+        linhas.append(
+            f"  - EAN {item['ean']} | Lote {item['batch']} | "
+            f"Val {item['expiry']} | Qtde {item['quantity']}"
+        )
+
+    return "\n".join(linhas) + "\n"
+
+
+def _escrever_atomico(caminho, conteudo):
+    # grava num .tmp e renomeia: quem lê a pasta nunca vê arquivo pela metade
+    tmp_path = caminho + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(conteudo)
+    os.replace(tmp_path, caminho)
+
+
+def escrever_outbox(resumo):
+    outbox = os.path.join(DIGEST_DIR, "outbox")
+    os.makedirs(outbox, exist_ok=True)
+
+    dia = resumo["dia"]
+
+    # anexos primeiro; o .txt por último sinaliza que o digest está completo
+    pasta = caminho_snapshot(date.fromisoformat(dia))
+    for arquivo in ["relatorio_validade.pdf", "relatorio_validade.xlsx"]:
+        nome, ext = os.path.splitext(arquivo)
+        with open(os.path.join(pasta, arquivo), "rb") as f:
+            _escrever_atomico(os.path.join(outbox, f"{nome}_{dia}{ext}"), f.read())
+
+    _escrever_atomico(
+        os.path.join(outbox, f"digest_{dia}.txt"),
+        formatar_digest(resumo).encode("utf-8"),
+    )
+
+    return outbox
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera o resumo diário de vencimentos.")
+    parser.add_argument(
+        "--data",
+        type=date.fromisoformat,
+        default=None,
+        help="Dia de referência (AAAA-MM-DD). Padrão: hoje.",
+    )
+    parser.add_argument(
+        "--dias",
+        type=int,
+        default=DIAS_A_VENCER,
+        help=f"Janela de 'a vencer' em dias. Padrão: {DIAS_A_VENCER}.",
+    )
+    parser.add_argument(
+        "--sem-outbox",
+        action="store_true",
+        help="Só grava o snapshot, sem escrever na outbox.",
+    )
+    args = parser.parse_args()
+
+    resumo = gerar_digest(args.data, args.dias)
+    print(
+        f"Snapshot {resumo['dia']}: {len(resumo['vencidos'])} vencidos, "
+        f"{len(resumo['a_vencer'])} a vencer."
+    )
+
+    if not args.sem_outbox:
+        outbox = escrever_outbox(resumo)
+        print(f"Digest escrito em {outbox}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+# =========================================
+# FILA LOCAL DE ESCRITAS (OFFLINE / REDE LENTA)
+# =========================================
+# As gravações do app entram primeiro num SQLite local (durável) e um worker
+# em segundo plano envia para o Postgres em lotes, com novas tentativas.
+#
+# Alterações de estoque são enfileiradas como movimentos relativos
+# (quantity = quantity ± n), nunca como quantidade absoluta: assim um envio
+# atrasado não sobrescreve o que a API ou outro usuário gravou nesse meio tempo.
+#
+# Cada operação tem uma chave de idempotência registrada na tabela
+# write_log do Postgres (schema/write_log.sql) na mesma transação da
+# escrita: se o commit chegou ao banco mas a resposta se perdeu, o reenvio
+# é ignorado.
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+import psycopg
+
+from dados import apply_movement_cur, get_conn, insert_product_cur, sinal_movimento
+
+FILA_DB = os.environ.get("FILA_DB", "fila_escritas.db")
+TAMANHO_LOTE = 50
+MAX_TENTATIVAS = 5
+INTERVALO_MIN = 2  # segundos entre varreduras com a rede ok
+INTERVALO_MAX = 300  # teto do backoff quando o banco está inacessível
+RETENCAO_DIAS = 30  # operações enviadas / chaves do write_log mais antigas são apagadas
+INTERVALO_PODA = 3600  # segundos entre limpezas
+
+_acordar = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+_status = {"ultimo_envio": None, "ultimo_erro": None}
+
+
+def _conectar():
+    conn = sqlite3.connect(FILA_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS operacoes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chave TEXT NOT NULL UNIQUE,
+            tipo TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            criado_em TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pendente',
+            tentativas INTEGER NOT NULL DEFAULT 0,
+            ultimo_erro TEXT
+        )
+        """
+    )
+    return conn
+
+
+# =========================================
+# ENFILEIRAR (CHAMADO PELO APP)
+# =========================================
+def enfileirar(tipo, payload):
+    chave = str(uuid.uuid4())
+    conn = _conectar()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO operacoes (chave, tipo, payload, criado_em)
+            VALUES (?, ?, ?, ?)
+            """,
+            (chave, tipo, json.dumps(payload), datetime.now().isoformat()),
+        )
+    conn.close()
+
+    # não espera o próximo ciclo do worker
+    _acordar.set()
+    return chave
+
+
+def enfileirar_produto(ean, batch, expiry, quantity):
+    return enfileirar(
+        "insert_product",
+        {
+            "ean": ean,
+            "batch": batch,
+            "expiry": expiry.isoformat(),
+            "quantity": quantity,
+        },
+    )
+
+
+def enfileirar_movimento(product_id, movement_type, quantity):
+    return enfileirar(
+        "movement",
+        {
+            "product_id": product_id,
+            "movement_type": movement_type,
+            "quantity": quantity,
+        },
+    )
+
+
+# =========================================
+# STATUS (PARA A TELA)
+# =========================================
+def resumo_fila():
+    conn = _conectar()
+    contagem = dict(
+        conn.execute("SELECT status, COUNT(*) FROM operacoes GROUP BY status").fetchall()
+    )
+    conn.close()
+    return {
+        "pendentes": contagem.get("pendente", 0),
+        "com_erro": contagem.get("erro", 0),
+        "ultimo_envio": _status["ultimo_envio"],
+        "ultimo_erro": _status["ultimo_erro"],
+    }
+
+
+def ajustes_pendentes():
+    # {product_id: variação} dos movimentos ainda não enviados, para somar
+    # à quantidade que veio do banco
+    conn = _conectar()
+    linhas = conn.execute(
+        """
+        SELECT payload FROM operacoes
+        WHERE tipo = 'movement' AND status = 'pendente'
+        ORDER BY id
+        """
+    ).fetchall()
+    conn.close()
+
+    pendentes = {}
+    for (payload,) in linhas:
+        mov = json.loads(payload)
+        variacao = sinal_movimento(mov["movement_type"]) * mov["quantity"]
+        pendentes[mov["product_id"]] = pendentes.get(mov["product_id"], 0) + variacao
+    return pendentes
+
+
+def listar_com_erro():
+    conn = _conectar()
+    linhas = conn.execute(
+        """
+        SELECT id, tipo, payload, criado_em, tentativas, ultimo_erro
+        FROM operacoes
+        WHERE status = 'erro'
+        ORDER BY id
+        """
+    ).fetchall()
+    conn.close()
+
+    return [
+        {
+            "id": op_id,
+            "tipo": tipo,
+            "payload": json.loads(payload),
+            "criado_em": criado_em,
+            "tentativas": tentativas,
+            "ultimo_erro": ultimo_erro,
+        }
+        for op_id, tipo, payload, criado_em, tentativas, ultimo_erro in linhas
+    ]
+
+
+def reenviar(op_id):
+    # devolve à fila com a mesma chave (continua idempotente)
+    conn = _conectar()
+    with conn:
+        conn.execute(
+            """
+            UPDATE operacoes
+            SET status = 'pendente', tentativas = 0, ultimo_erro = NULL
+            WHERE id = ? AND status = 'erro'
+            """,
+            (op_id,),
+        )
+    conn.close()
+    _acordar.set()
+
+
+def descartar(op_id):
+    conn = _conectar()
+    with conn:
+        conn.execute("DELETE FROM operacoes WHERE id = ? AND status = 'erro'", (op_id,))
+    conn.close()
+
+
+# =========================================
+# ENVIO PARA O POSTGRES
+# =========================================
+def _aplicar(cur, tipo, payload):
+    if tipo == "insert_product":
+        insert_product_cur(
+            cur,
+            payload["ean"],
+            payload["batch"],
+            date.fromisoformat(payload["expiry"]),
+            payload["quantity"],
+        )
+    elif tipo == "movement":
+        apply_movement_cur(
+            cur,
+            payload["product_id"],
+            payload["movement_type"],
+            payload["quantity"],
+        )
+    else:
+        raise ValueError(f"tipo de operação desconhecido: {tipo!r}")
+
+
+def processar_lote(limite=TAMANHO_LOTE):
+    # envia até `limite` operações pendentes numa única conexão, na ordem em
+    # que foram criadas; para no primeiro erro de rede para manter a ordem
+    fila = _conectar()
+    ops = fila.execute(
+        """
+        SELECT id, chave, tipo, payload FROM operacoes
+        WHERE status = 'pendente'
+        ORDER BY id
+        LIMIT ?
+        """,
+        (limite,),
+    ).fetchall()
+
+    if not ops:
+        fila.close()
+        return 0
+
+    enviados = 0
+    try:
+        pg = get_conn()
+    except Exception:
+        fila.close()
+        raise
+
+    try:
+        for op_id, chave, tipo, payload in ops:
+            try:
+                with pg.transaction():
+                    cur = pg.cursor()
+                    cur.execute(
+                        """
+                        INSERT INTO write_log (idempotency_key)
+                        VALUES (%s)
+                        ON CONFLICT DO NOTHING
+                        """,
+                        (chave,),
+                    )
+                    # rowcount 0 → já aplicada num envio anterior
+                    if cur.rowcount == 1:
+                        _aplicar(cur, tipo, json.loads(payload))
+                    cur.close()
+            except (psycopg.OperationalError, psycopg.ProgrammingError):
+                # sem conexão ou schema incompleto (ex.: write_log não criada):
+                # não é culpa da operação, então para o lote e ela segue pendente
+                raise
+            except (psycopg.Error, KeyError, ValueError) as e:
+                # erro de dados: não adianta insistir para sempre
+                with fila:
+                    fila.execute(
+                        """
+                        UPDATE operacoes
+                        SET tentativas = tentativas + 1,
+                            ultimo_erro = ?,
+                            status = CASE WHEN tentativas + 1 >= ? THEN 'erro' ELSE status END
+                        WHERE id = ?
+                        """,
+                        (str(e), MAX_TENTATIVAS, op_id),
+                    )
+                continue
+
+            with fila:
+                fila.execute(
+                    "UPDATE operacoes SET status = 'enviado', ultimo_erro = NULL WHERE id = ?",
+                    (op_id,),
+                )
+            enviados += 1
+    finally:
+        pg.close()
+        fila.close()
+
+    _status["ultimo_envio"] = datetime.now()
+    return enviados
+
+
+def podar(dias=RETENCAO_DIAS):
+    # apaga o histórico já enviado (SQLite) e as chaves antigas do write_log
+    limite = datetime.now() - timedelta(days=dias)
+
+    fila = _conectar()
+    with fila:
+        fila.execute(
+            "DELETE FROM operacoes WHERE status = 'enviado' AND criado_em < ?",
+            (limite.isoformat(),),
+        )
+    fila.close()
+
+    pg = get_conn()
+    try:
+        pg.execute(
+            "DELETE FROM write_log WHERE applied_at < now() - make_interval(days => %s)",
+            (dias,),
+        )
+        pg.commit()
+    finally:
+        pg.close()
+
+
+def _loop():
+    intervalo = INTERVALO_MIN
+    ultima_poda = None
+    while True:
+        try:
+            # esvazia a fila em lotes enquanto houver o que enviar
+            while processar_lote() > 0:
+                pass
+            if ultima_poda is None or time.monotonic() - ultima_poda > INTERVALO_PODA:
+                podar()
+                ultima_poda = time.monotonic()
+            _status["ultimo_erro"] = None
+            intervalo = INTERVALO_MIN
+        except psycopg.ProgrammingError as e:
+            _status["ultimo_erro"] = (
+                f"banco sem o schema esperado (aplique schema/write_log.sql): {e}"
+            )
+            intervalo = min(intervalo * 2, INTERVALO_MAX)
+        except Exception as e:
+            # rede/banco indisponível → backoff exponencial
+            _status["ultimo_erro"] = str(e)
+            intervalo = min(intervalo * 2, INTERVALO_MAX)
+
+        _acordar.wait(intervalo)
+        _acordar.clear()
+
+
+def iniciar_worker():
+    # um worker por processo (o Streamlit reexecuta o script a cada interação)
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_loop, name="fila-escritas", daemon=True)
+            _worker.start()
+    return _worker
@@ -0,0 +1,10 @@
+-- Chaves de idempotência das escritas já aplicadas.
+-- Usada pela fila local (fila.py) e pela API (api.py): a chave é gravada na
+-- mesma transação da escrita, então um reenvio da mesma chave é ignorado.
+-- Linhas mais antigas que fila.RETENCAO_DIAS são removidas pelo worker.
+CREATE TABLE IF NOT EXISTS write_log (
+    idempotency_key TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS write_log_applied_at_idx ON write_log (applied_at);
@@ -0,0 +1,119 @@
+import os
+import sys
+from contextlib import contextmanager
+
+import psycopg
+import pytest
+
+# os módulos do app ficam na raiz do repositório (sem pacote instalável)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dados
+import fila
+
+
+# =========================================
+# POSTGRES FALSO (TABELAS EM MEMÓRIA)
+# =========================================
+# Entende só o SQL que dados.py e fila.py emitem. Cada conexão trabalha numa
+# cópia das tabelas, que só vira estado do banco no commit (fechar sem
+# commit desfaz, como no Postgres).
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rowcount = -1
+        self._linha = None
+
+    def execute(self, sql, params=None):
+        conn = self.conn
+        sql = " ".join(sql.split())
+        if sql.startswith("INSERT INTO write_log"):
+            if not conn.banco.tem_write_log:
+                raise psycopg.errors.UndefinedTable('relation "write_log" does not exist')
+            chave = params[0]
+            self.rowcount = 0 if chave in conn.write_log else 1
+            conn.write_log.add(chave)
+        elif sql.startswith("INSERT INTO products"):
+            product_id = max(conn.products, default=0) + 1
+            conn.products[product_id] = params[3]
+            self._linha = (product_id,)
+        elif sql.startswith("UPDATE products SET quantity = quantity +"):
+            variacao, product_id, _ = params
+            if product_id in conn.banco.falhas:
+                raise conn.banco.falhas[product_id]
+            atual = conn.products.get(product_id)
+            if atual is None or atual + variacao < 0:
+                self.rowcount = 0
+            else:
+                conn.products[product_id] = atual + variacao
+                self.rowcount = 1
+        elif sql.startswith("SELECT quantity FROM products"):
+            atual = conn.products.get(params[0])
+            self._linha = None if atual is None else (atual,)
+        elif sql.startswith("INSERT INTO movements"):
+            if len(params) == 2:
+                # entrada do cadastro: tipo 'in' vem fixo no SQL
+                params = (params[0], "in", params[1])
+            conn.movements.append(tuple(params))
+        else:
+            raise AssertionError(f"SQL inesperado: {sql}")
+
+    def fetchone(self):
+        return self._linha
+
+    def close(self):
+        pass
+
+
+class FakeConn:
+    def __init__(self, banco):
+        self.banco = banco
+        self._copiar_do_banco()
+
+    def _copiar_do_banco(self):
+        self.products = dict(self.banco.products)
+        self.movements = list(self.banco.movements)
+        self.write_log = set(self.banco.write_log)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def execute(self, sql, params=None):
+        self.banco.executados.append((sql, params))
+
+    @contextmanager
+    def transaction(self):
+        try:
+            yield
+        except BaseException:
+            self._copiar_do_banco()
+            raise
+        self.commit()
+
+    def commit(self):
+        self.banco.products = dict(self.products)
+        self.banco.movements = list(self.movements)
+        self.banco.write_log = set(self.write_log)
+
+    def close(self):
+        self.banco.fechadas += 1
+
+
+class FakeBanco:
+    def __init__(self, products):
+        self.products = products
+        self.movements = []
+        self.write_log = set()
+        self.falhas = {}  # product_id → exceção levantada ao atualizar
+        self.tem_write_log = True
+        self.executados = []  # SQL executado direto na conexão
+        self.fechadas = 0
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    banco = FakeBanco({1: 10, 2: 3})
+    # fila importa get_conn por nome: troca nos dois módulos
+    monkeypatch.setattr(dados, "get_conn", lambda: FakeConn(banco))
+    monkeypatch.setattr(fila, "get_conn", lambda: FakeConn(banco))
+    return banco
@@ -0,0 +1,67 @@
+import pytest
+
+import dados
+
+
+def test_registrar_movimentos_aplica_variacao_relativa(banco):
+    total, repetido = dados.registrar_movimentos(
+        [
+            {"product_id": 1, "movement_type": "sale", "quantity": 4},
+            {"product_id": 2, "movement_type": "in", "quantity": 2},
+        ]
+    )
+
+    assert (total, repetido) == (2, False)
+    assert banco.products == {1: 6, 2: 5}
+    assert banco.movements == [(1, "sale", 4), (2, "in", 2)]
+    assert banco.fechadas == 1
+
+
+def test_mesma_chave_nao_baixa_duas_vezes(banco):
+    itens = [{"product_id": 1, "movement_type": "sale", "quantity": 4}]
+
+    assert dados.registrar_movimentos(itens, chave="pdv-1") == (1, False)
+    assert dados.registrar_movimentos(itens, chave="pdv-1") == (1, True)
+    assert banco.products[1] == 6
+    assert len(banco.movements) == 1
+    assert banco.fechadas == 2
+
+
+def test_produto_inexistente_desfaz_o_lote(banco):
+    with pytest.raises(dados.ProdutoNaoEncontrado):
+        dados.registrar_movimentos(
+            [
+                {"product_id": 1, "movement_type": "sale", "quantity": 1},
+                {"product_id": 99, "movement_type": "sale", "quantity": 1},
+            ],
+            chave="pdv-2",
+        )
+
+    assert banco.products == {1: 10, 2: 3}
+    assert banco.movements == []
+    # a chave também volta: o PDV pode corrigir e reenviar
+    assert banco.write_log == set()
+    assert banco.fechadas == 1
+
+
+def test_estoque_nao_fica_negativo(banco):
+    with pytest.raises(dados.EstoqueInsuficiente):
+        dados.registrar_movimentos(
+            [{"product_id": 2, "movement_type": "sale", "quantity": 4}]
+        )
+
+    assert banco.products[2] == 3
+    assert banco.movements == []
+
+
+@pytest.mark.parametrize(
+    "item",
+    [
+        {"product_id": 1, "movement_type": "roubo", "quantity": 1},
+        {"product_id": 1, "movement_type": "sale", "quantity": 0},
+    ],
+)
+def test_itens_invalidos_nem_abrem_conexao(banco, item):
+    with pytest.raises(ValueError):
+        dados.registrar_movimentos([item])
+    assert banco.fechadas == 0
@@ -0,0 +1,163 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import psycopg
+import pytest
+
+import fila
+
+
+@pytest.fixture(autouse=True)
+def fila_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(fila, "FILA_DB", str(tmp_path / "fila.db"))
+
+
+def _status(op_chave):
+    conn = sqlite3.connect(fila.FILA_DB)
+    status, tentativas = conn.execute(
+        "SELECT status, tentativas FROM operacoes WHERE chave = ?", (op_chave,)
+    ).fetchone()
+    conn.close()
+    return status, tentativas
+
+
+def test_envia_na_ordem_de_criacao(banco):
+    fila.enfileirar_produto("789", "L1", date(2026, 1, 31), 10)
+    fila.enfileirar_movimento(1, "sale", 4)
+    fila.enfileirar_movimento(1, "in", 2)
+
+    assert fila.processar_lote() == 3
+    assert banco.products == {1: 8, 2: 3, 3: 10}
+    assert banco.movements == [(3, "in", 10), (1, "sale", 4), (1, "in", 2)]
+    assert fila.resumo_fila()["pendentes"] == 0
+    assert banco.fechadas == 1
+
+
+def test_chave_ja_registrada_nao_e_reaplicada(banco):
+    chave = fila.enfileirar_movimento(1, "sale", 4)
+    banco.write_log.add(chave)  # commit anterior chegou, mas a resposta se perdeu
+
+    assert fila.processar_lote() == 1
+    assert banco.products[1] == 10
+    assert banco.movements == []
+    assert _status(chave) == ("enviado", 0)
+
+
+def test_erro_de_rede_interrompe_e_mantem_ordem(banco):
+    primeira = fila.enfileirar_movimento(1, "sale", 1)
+    segunda = fila.enfileirar_movimento(2, "sale", 1)
+    terceira = fila.enfileirar_movimento(1, "sale", 1)
+    banco.falhas[2] = psycopg.OperationalError("conexão perdida")
+
+    with pytest.raises(psycopg.OperationalError):
+        fila.processar_lote()
+
+    assert _status(primeira)[0] == "enviado"
+    # a segunda não consome tentativa (não é erro de dados) e a terceira espera
+    assert _status(segunda) == ("pendente", 0)
+    assert _status(terceira) == ("pendente", 0)
+    assert segunda not in banco.write_log
+    assert banco.products == {1: 9, 2: 3}
+    assert banco.fechadas == 1
+
+
+def test_sem_write_log_mantem_pendente(banco):
+    chave = fila.enfileirar_movimento(1, "sale", 1)
+    banco.tem_write_log = False
+
+    for _ in range(fila.MAX_TENTATIVAS + 1):
+        with pytest.raises(psycopg.ProgrammingError):
+            fila.processar_lote()
+
+    # schema incompleto não consome tentativas nem marca a operação como erro
+    assert _status(chave) == ("pendente", 0)
+
+    banco.tem_write_log = True
+    assert fila.processar_lote() == 1
+    assert banco.products[1] == 9
+
+
+def test_tipo_desconhecido_e_erro_de_dados(banco):
+    chave = fila.enfileirar("update_product_quantity", {"product_id": 1, "new_qty": 8})
+
+    assert fila.processar_lote() == 0
+    assert _status(chave) == ("pendente", 1)
+    assert banco.products[1] == 10
+    assert chave not in banco.write_log
+
+
+def test_erro_de_dados_vira_erro_apos_max_tentativas(banco):
+    ruim = fila.enfileirar_movimento(99, "sale", 1)
+    boa = fila.enfileirar_movimento(1, "sale", 1)
+
+    assert fila.processar_lote() == 1
+    assert _status(ruim) == ("pendente", 1)
+    assert _status(boa)[0] == "enviado"
+    # rollback: a chave não fica no write_log, então um reenvio pode aplicar
+    assert ruim not in banco.write_log
+
+    for _ in range(fila.MAX_TENTATIVAS - 1):
+        fila.processar_lote()
+
+    assert _status(ruim) == ("erro", fila.MAX_TENTATIVAS)
+    com_erro = fila.listar_com_erro()
+    assert [op["payload"]["product_id"] for op in com_erro] == [99]
+    assert "não encontrado" in com_erro[0]["ultimo_erro"]
+
+
+def test_reenviar_e_descartar(banco):
+    chave = fila.enfileirar_movimento(99, "sale", 1)
+    for _ in range(fila.MAX_TENTATIVAS):
+        fila.processar_lote()
+    op_id = fila.listar_com_erro()[0]["id"]
+
+    fila.reenviar(op_id)
+    assert _status(chave) == ("pendente", 0)
+
+    banco.products[99] = 5
+    assert fila.processar_lote() == 1
+    assert banco.products[99] == 4
+
+    outra = fila.enfileirar_movimento(98, "sale", 1)
+    for _ in range(fila.MAX_TENTATIVAS):
+        fila.processar_lote()
+    fila.descartar(fila.listar_com_erro()[0]["id"])
+    assert fila.listar_com_erro() == []
+    assert fila.resumo_fila()["com_erro"] == 0
+    assert outra not in banco.write_log
+
+
+def test_ajustes_pendentes_sao_relativos(banco):
+    fila.enfileirar_movimento(1, "in", 5)
+    fila.enfileirar_movimento(1, "sale", 2)
+    fila.enfileirar_movimento(2, "expired", 3)
+
+    assert fila.ajustes_pendentes() == {1: 3, 2: -3}
+
+    fila.processar_lote()
+    assert fila.ajustes_pendentes() == {}
+    assert banco.products == {1: 13, 2: 0}
+
+
+def test_podar_remove_enviadas_antigas(banco):
+    antiga = fila.enfileirar_movimento(1, "sale", 1)
+    recente = fila.enfileirar_movimento(1, "sale", 1)
+    pendente_antiga = fila.enfileirar_movimento(1, "sale", 1)
+    fila.processar_lote(limite=2)
+
+    velho = (datetime.now() - timedelta(days=fila.RETENCAO_DIAS + 1)).isoformat()
+    conn = sqlite3.connect(fila.FILA_DB)
+    with conn:
+        conn.execute(
+            "UPDATE operacoes SET criado_em = ? WHERE chave IN (?, ?)",
+            (velho, antiga, pendente_antiga),
+        )
+    conn.close()
+
+    fila.podar()
+
+    conn = sqlite3.connect(fila.FILA_DB)
+    restantes = {linha[0] for linha in conn.execute("SELECT chave FROM operacoes")}
+    conn.close()
+    assert restantes == {recente, pendente_antiga}
+    assert any("DELETE FROM write_log" in sql for sql, _ in banco.executados)